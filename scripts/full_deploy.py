@@ -5,18 +5,20 @@ Script to deploy the full LensHub system.
 # Imports
 import os
 import json
-from distutils.util import strtobool
+from concurrent.futures import ThreadPoolExecutor
 
 from brownie import accounts, web3, network, project, Contract
 from dotenv import load_dotenv
 
-from helpers.custom_verification import publish_source
+from helpers.custom_verification import prefetch_verification_info, publish_source
 
 
 # Load environment variables
 load_dotenv()
 
 # Define constants
+# Values accepted as true for boolean environment variables, as `distutils.util.strtobool` did
+TRUE_VALUES = {"y", "yes", "t", "true", "on", "1"}
 TREASURY_FEE_BPS = 50
 LENS_HUB_NFT_NAME = "Lens Protocol Profiles"
 LENS_HUB_NFT_SYMBOL = "LPP"
@@ -25,11 +27,44 @@ LENS_HUB_NFT_SYMBOL = "LPP"
 NETWORK_ID = os.getenv("NETWORK_ID", "live")
 # Use 'local' as the default network type. Possible options are 'local', 'testnet', and 'mainnet'
 NETWORK_TYPE = os.getenv("NETWORK_TYPE", "local")
-CONTRACT_VERIFICATION = strtobool(os.getenv("CONTRACT_VERIFICATION", "True"))
+CONTRACT_VERIFICATION = os.getenv("CONTRACT_VERIFICATION", "True").strip().lower() in TRUE_VALUES
 # Private Keys
 DEPLOYER_PRIVATE_KEY = os.getenv("DEPLOYER_PRIVATE_KEY")
 GOVERNANCE_PRIVATE_KEY = os.getenv("GOVERNANCE_PRIVATE_KEY")
 TREASURY_PRIVATE_KEY = os.getenv("TREASURY_PRIVATE_KEY")
+# Contracts deployed once the hub proxy is deployed, as tuples of their label in the addresses
+# file, their contract name and the names of their constructor arguments
+PERIPHERY_CONTRACTS = [
+    ("lens periphery", "LensPeriphery", ("lensHub",)),
+    ("currency", "Currency", ()),
+    ("UI data provider", "UIDataProvider", ("lensHub",)),
+    ("Profile creation proxy", "ProfileCreationProxy", ("profileCreator", "lensHub")),
+]
+COLLECT_MODULES = [
+    ("fee collect module", "FeeCollectModule", ("lensHub", "moduleGlobals")),
+    ("limited fee collect module", "LimitedFeeCollectModule", ("lensHub", "moduleGlobals")),
+    ("timed fee collect module", "TimedFeeCollectModule", ("lensHub", "moduleGlobals")),
+    (
+        "limited timed fee collect module",
+        "LimitedTimedFeeCollectModule",
+        ("lensHub", "moduleGlobals"),
+    ),
+    ("revert collect module", "RevertCollectModule", ()),
+    ("free collect module", "FreeCollectModule", ("lensHub",)),
+]
+FOLLOW_MODULES = [
+    ("fee follow module", "FeeFollowModule", ("lensHub", "moduleGlobals")),
+    ("profile follow module", "ProfileFollowModule", ("lensHub",)),
+    ("revert follow module", "RevertFollowModule", ("lensHub",)),
+]
+REFERENCE_MODULES = [
+    ("follower only reference module", "FollowerOnlyReferenceModule", ("lensHub",)),
+]
+# Number of verifications submitted to the explorer at the same time, most explorer API keys are
+# limited to 5 requests per second
+VERIFICATION_WORKERS = 4
+# Addresses of the deployed contracts, also used to resume a failed deployment
+ADDRESSES_PATH = f"build/lenshubAddresses-{NETWORK_ID}.json"
 
 if NETWORK_TYPE == "local":
     # Setting CONTRACT_VERIFICATION to False for local because Ganache-GUI does not support the
@@ -37,6 +72,200 @@ if NETWORK_TYPE == "local":
     CONTRACT_VERIFICATION = False
 
 
+def group_gas_price():
+    """
+    Returns the gas price to set on every transaction of a group.
+    When the network is configured with `gas_price: auto` and no EIP-1559 fees, the gas price is
+    fetched once for the whole group rather than once per transaction. Otherwise nothing is set,
+    so that Brownie applies the configured fees, fixed gas price or gas strategy itself.
+    """
+    if (
+        network.gas_price() == "auto"
+        and network.max_fee() is None
+        and network.priority_fee() is None
+    ):
+        return {"gas_price": web3.eth.gas_price}
+    return {}
+
+
+def broadcast_group(sender, nonce, calls):
+    """
+    Broadcasts a group of transactions that do not depend on each other.
+    Each call is a tuple of a contract method (or a contract container's `deploy`) followed by its
+    arguments. The transactions are broadcast back to back with consecutive nonces starting at
+    `nonce`, without waiting for confirmations, so the whole group is mined within a block or two
+    instead of one block per transaction.
+    Broadcasting stops at the first transaction that cannot be sent, e.g. when its gas estimation
+    reverts, but the transactions already sent are still returned so that they can be awaited.
+    Returns the pending transaction receipts in the same order as `calls`, and the error that
+    stopped the broadcast, if any.
+    """
+    transaction = {"from": sender, "required_confs": 0, **group_gas_price()}
+    receipts = []
+    try:
+        for i, (method, *args) in enumerate(calls):
+            receipts.append(method(*args, {**transaction, "nonce": nonce + i}))
+    except Exception as error:
+        return receipts, error
+
+    return receipts, None
+
+
+def raise_group_failures(failed, error):
+    """
+    Raises once every transaction of a group has been awaited, listing the `failed` transactions
+    and chaining the `error` that stopped the broadcast of the group, if any.
+    """
+    if failed:
+        raise ValueError("Failed: " + ", ".join(failed)) from error
+    if error is not None:
+        raise error
+
+
+def send_group(sender, nonce, calls):
+    """
+    Sends a group of transactions that do not depend on each other with `broadcast_group`, and
+    waits for all of them to be mined.
+    Raises a ValueError listing the failed transactions once all of them have been awaited.
+    Returns the transaction receipts in the same order as `calls`.
+    """
+    receipts, error = broadcast_group(sender, nonce, calls)
+    failed = []
+    for receipt in receipts:
+        receipt.wait(1)
+        if receipt.status != 1:
+            failed.append(f"{receipt.fn_name} ({receipt.txid})")
+
+    raise_group_failures(failed, error)
+    return receipts
+
+
+def is_deployed(address):
+    """
+    Returns whether there is a contract deployed at `address` on the connected network.
+    """
+    return address is not None and len(web3.eth.get_code(address)) > 0
+
+
+def load_addresses():
+    """
+    Loads the addresses saved by a previous run of the deployment on this network, if any.
+    """
+    if not os.path.exists(ADDRESSES_PATH):
+        return {}
+    with open(ADDRESSES_PATH, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_addresses(addresses):
+    """
+    Saves the addresses of the deployed contracts, so that a failed deployment can be resumed.
+    The file is replaced atomically, so an interrupted write never loses the saved addresses.
+    """
+    payload = json.dumps(addresses, indent=2)
+    with open(f"{ADDRESSES_PATH}.tmp", "w", encoding="utf-8") as file:
+        file.write(payload)
+    os.replace(f"{ADDRESSES_PATH}.tmp", ADDRESSES_PATH)
+
+
+def check_reused_governance(lenshubProject, addresses, governanceAddress):
+    """
+    Raises a ValueError if the hub proxy or the module globals saved by a previous run, and still
+    deployed on the network, are governed by another account than `governanceAddress`.
+    """
+    for label, interface in [
+        ("lensHub proxy", lenshubProject.interface.ILensHub),
+        ("module globals", lenshubProject.interface.IModuleGlobals),
+    ]:
+        address = addresses.get(label)
+        if not is_deployed(address):
+            continue
+        currentGovernance = interface(address).getGovernance()
+        if currentGovernance != governanceAddress:
+            raise ValueError(
+                f"The {label} at {address} saved in {ADDRESSES_PATH} is governed by "
+                f"{currentGovernance}, not by {governanceAddress}. "
+                f"Delete {ADDRESSES_PATH} to start a fresh deployment."
+            )
+
+
+def deploy_group(deployer, nonce, deployments, addresses, deployed):
+    """
+    Deploys a group of contracts that do not depend on each other with `broadcast_group`.
+    Each deployment is a tuple of the contract label in `addresses`, the contract container and
+    its constructor arguments. Contracts already recorded in `addresses` by a previous run, and
+    still deployed on the network, are reused instead of being deployed again. The address of
+    each new contract is recorded in `addresses` and saved as soon as it is mined. Every contract,
+    new or reused, is appended to `deployed` with its container for verification.
+    Raises once all the broadcast deployments have been awaited and saved if any of them failed.
+    Returns the contracts in the same order as `deployments`, and the next nonce of the deployer.
+    """
+    contracts = {}
+    pending = []
+    for label, container, *args in deployments:
+        if is_deployed(addresses.get(label)):
+            print(f"---- Reusing {label} at {addresses[label]}")
+            contracts[label] = container.at(addresses[label])
+            # A previous run may have failed before verifying it
+            deployed.append((container, contracts[label]))
+        else:
+            pending.append((label, container, args))
+
+    receipts, error = broadcast_group(
+        deployer, nonce, [(container.deploy, *args) for _, container, args in pending]
+    )
+    # Every broadcast deployment is awaited and saved even if an earlier one failed, so that a
+    # resumed run only has to deploy the failed ones
+    failed = []
+    for (label, container, _), receipt in zip(pending, receipts):
+        receipt.wait(1)
+        if receipt.status != 1:
+            failed.append(f"{label} ({receipt.txid})")
+            continue
+        contracts[label] = container.at(receipt.contract_address, tx=receipt)
+        addresses[label] = receipt.contract_address
+        save_addresses(addresses)
+        deployed.append((container, contracts[label]))
+
+    raise_group_failures(failed, error)
+    return [contracts[label] for label, *_ in deployments], nonce + len(pending)
+
+
+def verify_contracts(deployed):
+    """
+    Publishes the sources of the deployed contracts on the explorer, `VERIFICATION_WORKERS` at a
+    time. Each deployed contract is a tuple of the contract container and the contract.
+    Uses the custom verification because Brownie fails to verify the LensHub implementation with
+    libraries.
+    Returns the names of the contracts that could not be verified.
+    """
+
+    def verify(container, contract):
+        try:
+            # Reused contracts have no deployment transaction, their constructor arguments are
+            # queried from the explorer instead
+            verified = publish_source(
+                container,
+                contract,
+                silent=True,
+                deploy_tx_input=contract.tx.input if contract.tx else None,
+            )
+        except Exception as error:
+            # Verification is a best-effort step once everything is deployed, a malformed explorer
+            # reply or a failed prefetch must not abort the run before the summary
+            print(f"---- Could not verify {container._name}: {error!r}")
+            return False
+        print(f"---- {container._name} {'verified' if verified else 'failed verification'}")
+        return verified
+
+    with ThreadPoolExecutor(max_workers=VERIFICATION_WORKERS) as executor:
+        results = list(executor.map(lambda pair: verify(*pair), deployed))
+
+    return [
+        container._name for (container, _), verified in zip(deployed, results) if not verified
+    ]
+
+
 def main():
     """
     Main function.
@@ -61,47 +290,86 @@ def main():
     # Load the project and define the accounts
     lenshubProject = project.load(".")
 
+    if CONTRACT_VERIFICATION:
+        # Flatten the sources to verify in the background while the contracts are deployed
+        prefetch_verification_info(
+            lenshubProject[name]
+            for name in [
+                "ModuleGlobals",
+                "PublishingLogic",
+                "InteractionLogic",
+                "ProfileTokenURILogic",
+                "FollowNFT",
+                "CollectNFT",
+                "TransparentUpgradeableProxy",
+            ]
+            + [
+                name
+                for _, name, _ in PERIPHERY_CONTRACTS
+                + COLLECT_MODULES
+                + FOLLOW_MODULES
+                + REFERENCE_MODULES
+            ]
+        )
+
     deployer = accounts[0]
     governance = accounts[1]
     treasuryAddress = accounts[2].address
     proxyAdminAddress = profileCreatorAddress = deployer.address
 
-    # Get the nonce of deployer
-    deployerNonce = web3.eth.getTransactionCount(deployer.address)
+    # Get the nonces of the deployer and the governance. The governance does not send anything
+    # until the whitelisting, so both nonces are fetched together up front.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        deployerNonce, governanceNonce = executor.map(
+            web3.eth.getTransactionCount, [deployer.address, governance.address]
+        )
+
+    # Addresses deployed by a previous run of the deployment on this network, if any
+    lenshubAddresses = load_addresses()
+    if lenshubAddresses:
+        print(
+            f"-- Resuming the deployment saved in {ADDRESSES_PATH}, "
+            "delete it to start a fresh deployment"
+        )
+
+    # The hub implementation, the follow & collect NFT implementations and the hub proxy refer to
+    # each other through pre-computed addresses, so they can only be reused all together.
+    hubLabels = ["lensHub impl:", "follow NFT impl", "collect NFT impl", "lensHub proxy"]
+    if not all(is_deployed(lenshubAddresses.get(label)) for label in hubLabels):
+        for label in hubLabels:
+            lenshubAddresses.pop(label, None)
+
+    # Reused contracts keep the governance they were deployed with, so fail before sending
+    # anything rather than having the `onlyGov` whitelisting revert at the very end.
+    check_reused_governance(lenshubProject, lenshubAddresses, governance.address)
+
+    # Contracts deployed or reused by this run, verified once the whole system is deployed
+    deployedContracts = []
 
     # Deploy the LensHub system
-    # Deploy the Module Globals
-    print("-- Deploying Module Globals")
-    moduleGlobals = lenshubProject.ModuleGlobals.deploy(
-        governance.address,
-        treasuryAddress,
-        TREASURY_FEE_BPS,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    # Deploying Logic Libs
-    print("-- Deploying Logic Libs")
-    publishingLogic = lenshubProject.PublishingLogic.deploy(
-        {"from": deployer, "nonce": deployerNonce}, publish_source=CONTRACT_VERIFICATION
-    )
-    publishingLogicAddress = deployer.get_deployment_address(deployerNonce)
-    deployerNonce += 1
-
-    interactionLogic = lenshubProject.InteractionLogic.deploy(
-        {"from": deployer, "nonce": deployerNonce}, publish_source=CONTRACT_VERIFICATION
-    )
-    interactionLogicAddress = deployer.get_deployment_address(deployerNonce)
-    deployerNonce += 1
-
-    profileTokenURILogic = lenshubProject.ProfileTokenURILogic.deploy(
-        {"from": deployer, "nonce": deployerNonce}, publish_source=CONTRACT_VERIFICATION
+    # Deploy the Module Globals and the Logic Libs
+    print("-- Deploying Module Globals & Logic Libs")
+    (moduleGlobals, _, _, _), deployerNonce = deploy_group(
+        deployer,
+        deployerNonce,
+        [
+            (
+                "module globals",
+                lenshubProject.ModuleGlobals,
+                governance.address,
+                treasuryAddress,
+                TREASURY_FEE_BPS,
+            ),
+            ("publishing logic lib", lenshubProject.PublishingLogic),
+            ("interaction logic lib", lenshubProject.InteractionLogic),
+            ("profile token URI logic lib", lenshubProject.ProfileTokenURILogic),
+        ],
+        lenshubAddresses,
+        deployedContracts,
     )
-    profileTokenURILogicAddress = deployer.get_deployment_address(deployerNonce)
-    deployerNonce += 1
 
-    # Here, we pre-compute the nonces and addresses used to deploy the contracts.
+    # Here, we pre-compute the nonces and addresses used to deploy the contracts. Deployment
+    # addresses only depend on the deployer and the nonce, so they are derived locally.
     followNFTNonce = deployerNonce + 1
     collectNFTNonce = deployerNonce + 2
     hubProxyNonce = deployerNonce + 3
@@ -111,296 +379,113 @@ def main():
     hubProxyAddress = deployer.get_deployment_address(hubProxyNonce)
 
     # We deploy first the hub implementation, then the followNFT implementation, the collectNFT,
-    # and finally the hub proxy with initialization.
-    print("-- Deploying Hub Implementation")
-    lensHubImpl = lenshubProject.LensHub.deploy(
-        followNFTImplAddress,
-        collectNFTImplAddress,
-        {"from": deployer, "nonce": deployerNonce}
-    )
-    deployerNonce += 1
-    # Using custom verification because Brownie fails to verify the LensHub implementation 
-    # with libraries.
-    publish_source(lenshubProject.LensHub, lensHubImpl)
-
-    print("-- Deploying Follow & Collect NFT Implementations")
-    lenshubProject.FollowNFT.deploy(
-        hubProxyAddress,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    lenshubProject.CollectNFT.deploy(
-        hubProxyAddress,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
+    # and finally the hub proxy with initialization. The hub implementation is linked against the
+    # logic libs, so this group can only be sent once the libs are mined.
+    print("-- Deploying Hub Implementation & Follow & Collect NFT Implementations")
+    (lensHubImpl, _, _), deployerNonce = deploy_group(
+        deployer,
+        deployerNonce,
+        [
+            (
+                "lensHub impl:",
+                lenshubProject.LensHub,
+                followNFTImplAddress,
+                collectNFTImplAddress,
+            ),
+            ("follow NFT impl", lenshubProject.FollowNFT, hubProxyAddress),
+            ("collect NFT impl", lenshubProject.CollectNFT, hubProxyAddress),
+        ],
+        lenshubAddresses,
+        deployedContracts,
     )
-    deployerNonce += 1
 
+    # The proxy initializes the hub implementation in its constructor, so it is deployed on its
+    # own once the implementation is mined.
     print("-- Deploying Hub Proxy")
     data_lh_init = lenshubProject.interface.ILensHub(
         lensHubImpl.address
     ).initialize.encode_input(
         LENS_HUB_NFT_NAME, LENS_HUB_NFT_SYMBOL, governance.address
     )
-    proxy = lenshubProject.TransparentUpgradeableProxy.deploy(
-        lensHubImpl.address,
-        proxyAdminAddress,
-        data_lh_init,
-        {"from": deployer, "nonce": deployerNonce},
+    (proxy,), deployerNonce = deploy_group(
+        deployer,
+        deployerNonce,
+        [
+            (
+                "lensHub proxy",
+                lenshubProject.TransparentUpgradeableProxy,
+                lensHubImpl.address,
+                proxyAdminAddress,
+                data_lh_init,
+            ),
+        ],
+        lenshubAddresses,
+        deployedContracts,
     )
-    deployerNonce += 1
-    # Using custom verification because Brownie fails to verify the LensHub implementation 
-    # with libraries.
-    publish_source(lenshubProject.TransparentUpgradeableProxy, proxy)
-    
 
     # Connect the hub proxy to the LensHub factory and the governance for ease of use.
     lensHub = Contract.from_abi("LensHub", proxy.address, lensHubImpl.abi, governance)
 
-    print("-- Deploying Lens Periphery")
-    lensPeriphery = lenshubProject.LensPeriphery.deploy(
-        lensHub.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    # Currency
-    print("-- Deploying Currency")
-    currency = lenshubProject.Currency.deploy(
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    # Deploy Collect modules
-    print("-- Deploying feeCollectModule")
-    feeCollectModule = lenshubProject.FeeCollectModule.deploy(
-        lensHub.address,
-        moduleGlobals.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    print("-- Deploying limitedFeeCollectModule")
-    limitedFeeCollectModule = lenshubProject.LimitedFeeCollectModule.deploy(
-        lensHub.address,
-        moduleGlobals.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    print("-- Deploying timedFeeCollectModule")
-    timedFeeCollectModule = lenshubProject.TimedFeeCollectModule.deploy(
-        lensHub.address,
-        moduleGlobals.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    print("-- Deploying limitedTimedFeeCollectModule")
-    limitedTimedFeeCollectModule = lenshubProject.LimitedTimedFeeCollectModule.deploy(
-        lensHub.address,
-        moduleGlobals.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    print("-- Deploying revertCollectModule")
-    revertCollectModule = lenshubProject.RevertCollectModule.deploy(
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    print("-- Deploying freeCollectModule")
-    freeCollectModule = lenshubProject.FreeCollectModule.deploy(
-        lensHub.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    # Deploy Follow modules
-    print("-- Deploying feeFollowModule")
-    feeFollowModule = lenshubProject.FeeFollowModule.deploy(
-        lensHub.address,
-        moduleGlobals.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    print("-- Deploying profileFollowModule")
-    profileFollowModule = lenshubProject.ProfileFollowModule.deploy(
-        lensHub.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    print("-- Deploying revertFollowModule")
-    revertFollowModule = lenshubProject.RevertFollowModule.deploy(
-        lensHub.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    # Deploy reference module
-    print("-- Deploying followerOnlyReferenceModule")
-    followerOnlyReferenceModule = lenshubProject.FollowerOnlyReferenceModule.deploy(
-        lensHub.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    # Deploy UIDataProvider
-    print("-- Deploying followerOnlyReferenceModule")
-    uiDataProvider = lenshubProject.UIDataProvider.deploy(
-        lensHub.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    print("-- Deploying profileCreationProxy")
-    profileCreationProxy = lenshubProject.ProfileCreationProxy.deploy(
-        profileCreatorAddress,
-        lensHub.address,
-        {"from": deployer, "nonce": deployerNonce},
-        publish_source=CONTRACT_VERIFICATION,
-    )
-    deployerNonce += 1
-
-    # Whitelist collect modules
-    print("-- Whitelisting collect modules")
-    governanceNonce = web3.eth.getTransactionCount(governance.address)
-
-    lensHub.whitelistCollectModule(
-        feeCollectModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce}
-    )
-    governanceNonce += 1
-
-    lensHub.whitelistCollectModule(
-        limitedFeeCollectModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    lensHub.whitelistCollectModule(
-        timedFeeCollectModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    lensHub.whitelistCollectModule(
-        limitedTimedFeeCollectModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    lensHub.whitelistCollectModule(
-        revertCollectModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    lensHub.whitelistCollectModule(
-        freeCollectModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    print("-- Whitelisting follow modules")
-    lensHub.whitelistFollowModule(
-        feeFollowModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    lensHub.whitelistFollowModule(
-        profileFollowModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    lensHub.whitelistFollowModule(
-        revertFollowModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    print("-- Whitelisting reference modules")
-    lensHub.whitelistReferenceModule(
-        followerOnlyReferenceModule.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    # Whitelist Currency
-    print("-- Whitelisting Currency in Module Globals")
-    moduleGlobals.whitelistCurrency(
-        currency.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    # Whitelist the profile creation proxy
-    print("-- Whitelisting Profile Creation Proxy")
-    lensHub.whitelistProfileCreator(
-        profileCreationProxy.address,
-        True,
-        {"from": governance, "nonce": governanceNonce},
-    )
-    governanceNonce += 1
-
-    lenshubAddresses = {
-        "lensHub proxy": lensHub.address,
-        "lensHub impl:": lensHubImpl.address,
-        "publishing logic lib": publishingLogic.address,
-        "interaction logic lib": interactionLogic.address,
-        "follow NFT impl": followNFTImplAddress,
-        "collect NFT impl": collectNFTImplAddress,
-        "currency": currency.address,
-        "lens periphery": lensPeriphery.address,
-        "module globals": moduleGlobals.address,
-        "fee collect module": feeCollectModule.address,
-        "limited fee collect module": limitedFeeCollectModule.address,
-        "timed fee collect module": timedFeeCollectModule.address,
-        "limited timed fee collect module": limitedTimedFeeCollectModule.address,
-        "revert collect module": revertCollectModule.address,
-        "free collect module": freeCollectModule.address,
-        "fee follow module": feeFollowModule.address,
-        "profile follow module": profileFollowModule.address,
-        "revert follow module": revertFollowModule.address,
-        "follower only reference module": followerOnlyReferenceModule.address,
-        "UI data provider": uiDataProvider.address,
-        "Profile creation proxy": profileCreationProxy.address,
+    # Deploy the periphery, the currency, the UIDataProvider, the profile creation proxy and the
+    # collect, follow and reference modules. They only depend on the hub proxy and the module
+    # globals, so they are all sent together.
+    print(
+        "-- Deploying Lens Periphery, Currency, UIDataProvider, Profile Creation Proxy, "
+        "Collect, Follow & Reference Modules"
+    )
+    constructorArguments = {
+        "lensHub": lensHub.address,
+        "moduleGlobals": moduleGlobals.address,
+        "profileCreator": profileCreatorAddress,
     }
-    json.dump(
+    contractsToDeploy = PERIPHERY_CONTRACTS + COLLECT_MODULES + FOLLOW_MODULES + REFERENCE_MODULES
+    contracts, deployerNonce = deploy_group(
+        deployer,
+        deployerNonce,
+        [
+            (label, lenshubProject[name], *[constructorArguments[arg] for arg in args])
+            for label, name, args in contractsToDeploy
+        ],
         lenshubAddresses,
-        open(f"build/lenshubAddresses-{NETWORK_ID}.json", "w", encoding="utf-8"),
-    )
+        deployedContracts,
+    )
+    contracts = dict(zip((label for label, *_ in contractsToDeploy), contracts))
+
+    # The whitelisting calls are all `onlyGov`, so they have to be sent by the governance itself
+    # rather than through a batching contract. They do not depend on each other though, so they
+    # are sent together and mined in the same few blocks.
+    print(
+        "-- Whitelisting collect, follow & reference modules, Currency in Module Globals "
+        "& Profile Creation Proxy"
+    )
+    whitelistCalls = (
+        [
+            (lensHub.whitelistCollectModule, contracts[label].address, True)
+            for label, *_ in COLLECT_MODULES
+        ]
+        + [
+            (lensHub.whitelistFollowModule, contracts[label].address, True)
+            for label, *_ in FOLLOW_MODULES
+        ]
+        + [
+            (lensHub.whitelistReferenceModule, contracts[label].address, True)
+            for label, *_ in REFERENCE_MODULES
+        ]
+        + [
+            (moduleGlobals.whitelistCurrency, contracts["currency"].address, True),
+            (lensHub.whitelistProfileCreator, contracts["Profile creation proxy"].address, True),
+        ]
+    )
+    send_group(governance, governanceNonce, whitelistCalls)
+    governanceNonce += len(whitelistCalls)
+
+    if CONTRACT_VERIFICATION:
+        # The verifications are independent, so they are submitted together once everything is
+        # deployed instead of blocking each deployment group.
+        print("-- Verifying contracts")
+        unverified = verify_contracts(deployedContracts)
+        if unverified:
+            print("-- Could not verify: " + ", ".join(unverified))
 
 
 if __name__ == "__main__":
@@ -3,16 +3,20 @@ Implementation of helper functions for custom verification due to bugs in the
 Brownie `publish_source` feature.
 """
 
-from typing import Dict
-import io
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple, Union
 import os
 import json
+import random
 import re
 import time
 from pathlib import Path
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from brownie import network
 from brownie._config import CONFIG, REQUEST_HEADERS
 from brownie.network.contract import _explorer_tokens
@@ -20,6 +24,90 @@ from brownie.network.web3 import _resolve_address
 from brownie.utils import color
 from brownie.project import compiler
 from brownie.project.flattener import Flattener
+from brownie.project.sources import Sources
+
+# Library placeholders left by the compiler in unlinked bytecode, e.g. `__PublishingLogic_____`,
+# shared by `get_verification_info` and `prefetch_verification_info`
+_LIBRARY_PLACEHOLDER_PATTERN = re.compile(r"_{1,}[^_]*_{1,}")
+
+# Etherscan license codes by SPDX identifier (https://etherscan.io/contract-license-types).
+# `agpl`/`lgpl` come before `gpl` so that the fuzzy match does not mistake them for `gpl`.
+_LICENSE_CODES = {
+    "unlicensed": 2,
+    "mit": 3,
+    "agpl-3.0": 13,
+    "lgpl-2.1": 6,
+    "lgpl-3.0": 7,
+    "gpl-2.0": 4,
+    "gpl-3.0": 5,
+    "bsd-2-clause": 8,
+    "bsd-3-clause": 9,
+    "mpl-2.0": 10,
+    "osl-3.0": 11,
+    "apache-2.0": 12,
+}
+
+# Shared session so that the explorer polls reuse pooled keep-alive connections instead of
+# paying the DNS lookup and TLS handshake on every request
+_session = requests.Session()
+_session.headers.update(REQUEST_HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[429, 502, 503, 504],
+        # Hand the last response back so that the status code checks below still report it
+        raise_on_status=False,
+    ),
+)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+# Pending `get_verification_info` calls started by `prefetch_verification_info`, by contract name
+_prefetched_verification_info: Dict[str, Future] = {}
+
+def _is_already_verified(result: str) -> bool:
+    """Return whether an explorer result reports that the contract source is already verified"""
+    return "already verified" in str(result).lower()
+
+def _poll_delay(attempt: int) -> float:
+    """
+    Return the number of seconds to wait before the next explorer poll.
+    Exponential backoff starting at 1.5s and capped at 30s, with some jitter
+    """
+    return min(30, 1.5 * 2**attempt + random.uniform(0, 0.5))
+
+@lru_cache(maxsize=8)
+def _resolved_project_path(project_path: Path) -> Path:
+    """Return the resolved path of a project, resolved once per project"""
+    return Path(project_path).resolve()
+
+@lru_cache(maxsize=8)
+def _solc_remappings(
+    remappings: Optional[Union[str, Tuple[str, ...]]],
+) -> Tuple[Tuple[str, str], ...]:
+    """
+    Return the solc remappings of a project as `(prefix, path)` pairs.
+    Brownie scans the installed packages to build them, so they are computed once per
+    project configuration
+    """
+    if isinstance(remappings, tuple):
+        remappings = list(remappings)
+    return tuple(
+        tuple(remapping.split("=", 1))
+        for remapping in compiler._get_solc_remappings(remappings)
+    )
+
+@lru_cache(maxsize=None)
+def _library_source_name(sources: Sources, lib: str) -> str:
+    """
+    Return the name of the source file declaring a library.
+    Only the source lookup is cached, the library address is read from the project on every call
+    since a library can be redeployed
+    """
+    return Path(sources.get_source_path(lib)).name
 
 def get_verification_info(self: network.contract.ContractContainer) -> Dict:
     """
@@ -35,22 +123,21 @@ def get_verification_info(self: network.contract.ContractContainer) -> Dict:
     elif language == "Solidity":
         if self._flattener is None:
             source_fp = (
-                Path(self._project._path)
+                _resolved_project_path(self._project._path)
                 .joinpath(self._build["sourcePath"])
-                .resolve()
                 .as_posix()
             )
             config = self._project._compiler_config
+            remappings = config["solc"]["remappings"]
             remaps = dict(
-                map(
-                    lambda s: s.split("=", 1),
-                    compiler._get_solc_remappings(config["solc"]["remappings"]),
+                _solc_remappings(
+                    tuple(remappings) if isinstance(remappings, list) else remappings
                 )
             )
-            libs = {lib.strip("_") for lib in re.findall("_{1,}[^_]*_{1,}", self.bytecode)}
+            libs = {lib.strip("_") for lib in _LIBRARY_PLACEHOLDER_PATTERN.findall(self.bytecode)}
             libraries = {}
             for lib in libs:
-                lib_source_fp = Path(self._sources.get_source_path(lib)).name
+                lib_source_fp = _library_source_name(self._sources, lib)
                 if lib_source_fp in libraries:
                     libraries[lib_source_fp][lib] = self._project[lib][-1].address
                 else:
@@ -76,68 +163,26 @@ def get_verification_info(self: network.contract.ContractContainer) -> Dict:
     else:
         raise TypeError(f"Unsupported language for source verification: {language}")
 
-def publish_source(self: network.contract.ContractContainer, 
-                   contract: network.contract.ProjectContract, 
-                   silent: bool = False) -> bool:
-    """Flatten contract and publish source on the selected explorer"""
-
-    # Check required conditions for verifying
-    url = CONFIG.active_network.get("explorer")
-    if url is None:
-        raise ValueError("Explorer API not set for this network")
-    env_token = next((v for k, v in _explorer_tokens.items() if k in url), None)
-    if env_token is None:
-        raise ValueError(
-            f"Publishing source is only supported on {', '.join(_explorer_tokens)},"
-            "change the Explorer API"
-        )
-
-    if os.getenv(env_token):
-        api_key = os.getenv(env_token)
-    else:
-        host = urlparse(url).netloc
-        host = host[host.index(".") + 1 :]
-        raise ValueError(
-            f"An API token is required to verify contract source code. Visit https://{host}/ "
-            f"to obtain a token, and then store it as the environment variable ${env_token}"
-        )
-
-    address = _resolve_address(contract.address)
-
-    # Get source code and contract/compiler information
-    contract_info = get_verification_info(self)
-
-    # Select matching license code (https://etherscan.io/contract-license-types)
-    license_code = 1
-    identifier = contract_info["license_identifier"].lower()
-    if "unlicensed" in identifier:
-        license_code = 2
-    elif "mit" in identifier:
-        license_code = 3
-    elif "agpl" in identifier and "3.0" in identifier:
-        license_code = 13
-    elif "lgpl" in identifier:
-        if "2.1" in identifier:
-            license_code = 6
-        elif "3.0" in identifier:
-            license_code = 7
-    elif "gpl" in identifier:
-        if "2.0" in identifier:
-            license_code = 4
-        elif "3.0" in identifier:
-            license_code = 5
-    elif "bsd-2-clause" in identifier:
-        license_code = 8
-    elif "bsd-3-clause" in identifier:
-        license_code = 9
-    elif "mpl" in identifier and "2.0" in identifier:
-        license_code = 10
-    elif identifier.startswith("osl") and "3.0" in identifier:
-        license_code = 11
-    elif "apache" in identifier and "2.0" in identifier:
-        license_code = 12
+def prefetch_verification_info(
+    containers: Iterable[network.contract.ContractContainer],
+) -> None:
+    """
+    Flatten the sources of the given contracts in background threads, so that the work is
+    already done by the time `publish_source` is called for them.
+    Contracts linked against libraries are skipped, their compiler settings need the addresses
+    of the deployed libraries.
+    """
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    for container in containers:
+        if not _LIBRARY_PLACEHOLDER_PATTERN.search(container.bytecode):
+            _prefetched_verification_info[container._name] = executor.submit(
+                get_verification_info, container
+            )
+    executor.shutdown(wait=False)
 
-    # get constructor arguments
+def _query_constructor_arguments(url: str, api_key: str, address: str, bytecode_len: int,
+                                 silent: bool) -> str:
+    """Query the constructor arguments of a contract from its deployment on the explorer"""
     params_tx: Dict = {
         "apikey": api_key,
         "module": "account",
@@ -149,7 +194,7 @@ def publish_source(self: network.contract.ContractContainer,
     }
     i = 0
     while True:
-        response = requests.get(url, params=params_tx, headers=REQUEST_HEADERS)
+        response = _session.get(url, params=params_tx)
         if response.status_code != 200:
             raise ConnectionError(
                 f"Status {response.status_code} when querying {url}: {response.text}"
@@ -166,13 +211,66 @@ def publish_source(self: network.contract.ContractContainer,
                 raise ValueError(f"API request failed with: {data['result']}")
             elif i == 0 and not silent:
                 print(f"Waiting for {url} to process contract...")
+            time.sleep(_poll_delay(i))
             i += 1
-            time.sleep(10)
 
     if data["message"] == "OK":
-        constructor_arguments = data["result"][0]["input"][contract_info["bytecode_len"] + 2 :]
+        return data["result"][0]["input"][bytecode_len + 2 :]
+    return ""
+
+def publish_source(self: network.contract.ContractContainer, 
+                   contract: network.contract.ProjectContract, 
+                   silent: bool = False,
+                   deploy_tx_input: Optional[str] = None) -> bool:
+    """
+    Flatten contract and publish source on the selected explorer.
+    The constructor arguments are read from `deploy_tx_input`, the input of the deployment
+    transaction, when given, and queried from the explorer otherwise
+    """
+
+    # Check required conditions for verifying
+    url = CONFIG.active_network.get("explorer")
+    if url is None:
+        raise ValueError("Explorer API not set for this network")
+    env_token = next((v for k, v in _explorer_tokens.items() if k in url), None)
+    if env_token is None:
+        raise ValueError(
+            f"Publishing source is only supported on {', '.join(_explorer_tokens)},"
+            "change the Explorer API"
+        )
+
+    if os.getenv(env_token):
+        api_key = os.getenv(env_token)
     else:
-        constructor_arguments = ""
+        host = urlparse(url).netloc
+        host = host[host.index(".") + 1 :]
+        raise ValueError(
+            f"An API token is required to verify contract source code. Visit https://{host}/ "
+            f"to obtain a token, and then store it as the environment variable ${env_token}"
+        )
+
+    address = _resolve_address(contract.address)
+
+    # Get source code and contract/compiler information, waiting for the prefetch if any
+    prefetched = _prefetched_verification_info.pop(self._name, None)
+    contract_info = prefetched.result() if prefetched else get_verification_info(self)
+
+    # Select matching license code (https://etherscan.io/contract-license-types)
+    identifier = contract_info["license_identifier"].strip().lower()
+    license_code = _LICENSE_CODES.get(identifier)
+    if license_code is None:
+        # Fall back to a fuzzy match for identifiers such as `GPL-3.0-or-later`
+        license_code = next(
+            (code for token, code in _LICENSE_CODES.items() if token in identifier), 1
+        )
+
+    # get constructor arguments
+    if deploy_tx_input is not None:
+        constructor_arguments = deploy_tx_input[contract_info["bytecode_len"] + 2 :]
+    else:
+        constructor_arguments = _query_constructor_arguments(
+            url, api_key, address, contract_info["bytecode_len"], silent
+        )
 
     # Submit verification
     payload_verification: Dict = {
@@ -180,7 +278,7 @@ def publish_source(self: network.contract.ContractContainer,
         "module": "contract",
         "action": "verifysourcecode",
         "contractaddress": address,
-        "sourceCode": io.StringIO(json.dumps(self._flattener.standard_input_json)),
+        "sourceCode": json.dumps(self._flattener.standard_input_json),
         "codeformat": "solidity-standard-json-input",
         "contractname": f"{self._flattener.contract_file}:{self._flattener.contract_name}",
         "compilerversion": f"v{contract_info['compiler_version']}",
@@ -189,20 +287,35 @@ def publish_source(self: network.contract.ContractContainer,
         "constructorArguements": constructor_arguments,
         "licenseType": license_code,
     }
-    response = requests.post(url, data=payload_verification, headers=REQUEST_HEADERS)
-    if response.status_code != 200:
-        raise ConnectionError(
-            f"Status {response.status_code} when querying {url}: {response.text}"
-        )
-    data = response.json()
-    if int(data["status"]) != 1:
-        raise ValueError(f"Failed to submit verification request: {data['result']}")
+    i = 0
+    while True:
+        response = _session.post(url, data=payload_verification)
+        if response.status_code != 200:
+            raise ConnectionError(
+                f"Status {response.status_code} when querying {url}: {response.text}"
+            )
+        data = response.json()
+        if int(data["status"]) == 1:
+            break
+        if _is_already_verified(data["result"]):
+            if not silent:
+                print(f"Contract already verified: {data['result']}")
+            return True
+        # Without the txlist poll the explorer may not have processed the contract yet
+        # After 10 loops we throw with the API result message
+        if "Unable to locate ContractCode" not in data["result"] or i >= 10:
+            raise ValueError(f"Failed to submit verification request: {data['result']}")
+        elif i == 0 and not silent:
+            print(f"Waiting for {url} to process contract...")
+        time.sleep(_poll_delay(i))
+        i += 1
 
     # Status of request
     guid = data["result"]
     if not silent:
         print("Verification submitted successfully. Waiting for result...")
-    time.sleep(10)
+    i = 0
+    time.sleep(_poll_delay(i))
     params_status: Dict = {
         "apikey": api_key,
         "module": "contract",
@@ -210,7 +323,7 @@ def publish_source(self: network.contract.ContractContainer,
         "guid": guid,
     }
     while True:
-        response = requests.get(url, params=params_status, headers=REQUEST_HEADERS)
+        response = _session.get(url, params=params_status)
         if response.status_code != 200:
             raise ConnectionError(
                 f"Status {response.status_code} when querying {url}: {response.text}"
@@ -220,8 +333,10 @@ def publish_source(self: network.contract.ContractContainer,
             if not silent:
                 print("Verification pending...")
         else:
+            verified = data["message"] == "OK" or _is_already_verified(data["result"])
             if not silent:
-                col = "bright green" if data["message"] == "OK" else "bright red"
+                col = "bright green" if verified else "bright red"
                 print(f"Verification complete. Result: {color(col)}{data['result']}{color}")
-            return data["message"] == "OK"
-        time.sleep(10)
+            return verified
+        i += 1
+        time.sleep(_poll_delay(i))